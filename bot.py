@@ -1,18 +1,51 @@
 import os
 import logging
-import sqlite3
 from datetime import datetime, timedelta
-from typing import Optional, List
+from typing import Callable, NamedTuple, Optional, List
 import asyncio
+import heapq
+import html
+import json
+import operator
+import random
+import time
 import re
+from collections import OrderedDict
+from itertools import groupby
+from contextlib import asynccontextmanager
 
+import aiosqlite
 from aiogram import Bot, Dispatcher, types, F
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.exceptions import TelegramRetryAfter
 from aiogram.filters import Command
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
-from aiogram.fsm.storage.memory import MemoryStorage
+from aiogram.fsm.storage.memory import MemoryStorage, SimpleEventIsolation
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
 from aiohttp import web
+from aiolimiter import AsyncLimiter
+
+try:
+    import ahocorasick
+except ImportError:
+    # pyahocorasick is a C extension; without it intents and keywords are
+    # matched with compiled regexes instead
+    ahocorasick = None
+
+try:
+    import orjson
+    _json_loads = orjson.loads
+except ImportError:
+    # orjson is a C extension used to decode updates and API responses
+    _json_loads = json.loads
+
+try:
+    import uvloop
+except ImportError:
+    # uvloop is optional (and unavailable on Windows); asyncio's default
+    # event loop is used without it
+    uvloop = None
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -26,36 +59,411 @@ WEBHOOK_URL = f"{WEBHOOK_HOST}{WEBHOOK_PATH}"
 PORT = int(os.getenv("PORT", 10000))  # Render uses port 10000
 
 # Initialize bot and dispatcher
-bot = Bot(token=BOT_TOKEN)
+bot = Bot(token=BOT_TOKEN, session=AiohttpSession(json_loads=_json_loads))
 storage = MemoryStorage()
-dp = Dispatcher(storage=storage)
+# Webhooks are acknowledged before their update is handled, so updates from
+# the same user can overlap; isolation runs them one at a time per chat/user
+# so FSM flows see each step in order
+dp = Dispatcher(storage=storage, events_isolation=SimpleEventIsolation())
 
 # Database setup
 DB_NAME = "marketplace.db"
 
-def init_db():
-    """Initialize the database with required tables"""
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
-    
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS vendors (
-            vendor_id INTEGER PRIMARY KEY AUTOINCREMENT,
-            telegram_id INTEGER UNIQUE NOT NULL,
-            business_name TEXT NOT NULL,
-            services TEXT NOT NULL,
-            keywords TEXT NOT NULL,
-            contact TEXT NOT NULL,
-            bot_username TEXT,
-            description TEXT,
-            price_range TEXT,
-            total_orders INTEGER DEFAULT 0,
-            avg_rating REAL DEFAULT 0.0,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-    """)
+# Order follow-ups: how long after ordering to check in with the buyer (an
+# SQLite datetime modifier) and how often the worker looks for due ones
+FOLLOWUP_DELAY = "+1 day"
+FOLLOWUP_POLL_SECONDS = 60
+FOLLOWUP_BATCH_SIZE = 100
+
+# Maximum number of vendors kept in the order-notification lookup cache
+VENDOR_CACHE_SIZE = 1024
+
+# Seconds a cached (business_name, contact) pair is served before re-reading
+CONTACT_CACHE_TTL = 60
+
+# Telegram allows about 30 messages per second per bot; stay just under it.
+# Only messages sent through the outbound queue (follow-ups and the /myrating
+# card) are paced; handlers' direct replies are not counted against this
+OUTBOUND_RATE = 28
+OUTBOUND_WORKERS = 8
+
+# Reviews arriving within this many seconds of each other share one commit
+RATING_FLUSH_SECONDS = 0.01
+RATING_BATCH_SIZE = 100
+
+# Follow-up worker and rating card warm-up tasks, started on startup
+_followup_task: Optional[asyncio.Task] = None
+_warmup_task: Optional[asyncio.Task] = None
+
+# Parallel webhook connections Telegram may open to deliver updates
+WEBHOOK_MAX_CONNECTIONS = 100
+
+# Acknowledged updates waiting for a worker; when full, webhooks get a 503
+# and Telegram redelivers later. The workers bound how many users are served
+# at once; one user's updates still run one at a time (see events_isolation)
+UPDATE_QUEUE_SIZE = 10_000
+UPDATE_WORKERS = 64
+_update_queue: asyncio.Queue = asyncio.Queue(maxsize=UPDATE_QUEUE_SIZE)
+_update_workers: List[asyncio.Task] = []
+
+# (telegram_id, business_name) per vendor_id, least recently used first.
+# Neither field can change after registration, so entries never go stale.
+_vendor_notify_cache: "OrderedDict[int, tuple]" = OrderedDict()
+
+# (fetched_at, (business_name, contact)) per vendor_id, least recently used first
+_contact_cache: "OrderedDict[int, tuple]" = OrderedDict()
+
+# Rendered /myrating card per vendor_id, least recently used first; dropped
+# whenever the vendor gets a new rating
+_rating_card_cache: "OrderedDict[int, str]" = OrderedDict()
+
+# vendor_id per vendor telegram_id (fixed at registration)
+_vendor_id_by_telegram: dict = {}
+
+# Bumped on every rating update so a card rendered from rows read before the
+# update is not cached after it
+_rating_generation = 0
+
+# keywords is the lowercased services text, kept up to date by SQLite
+VENDORS_TABLE_SQL = """
+    CREATE TABLE IF NOT EXISTS {table} (
+        vendor_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        telegram_id INTEGER UNIQUE NOT NULL,
+        business_name TEXT NOT NULL,
+        services TEXT NOT NULL,
+        keywords TEXT GENERATED ALWAYS AS (lower(services)) VIRTUAL,
+        contact TEXT NOT NULL,
+        bot_username TEXT,
+        description TEXT,
+        price_range TEXT,
+        total_orders INTEGER DEFAULT 0,
+        avg_rating REAL DEFAULT 0.0,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+"""
+
+# Queries used by the handlers
+SQL_SEARCH_VENDORS = """
+    SELECT v.vendor_id, v.business_name, v.services, v.keywords, v.description,
+           v.contact, v.bot_username, v.price_range, v.avg_rating, v.total_orders,
+           bm25(vendors_fts) AS rank
+    FROM vendors_fts
+    JOIN vendors v ON v.vendor_id = vendors_fts.rowid
+    WHERE vendors_fts MATCH ?
+    ORDER BY rank
+    LIMIT 20
+"""
+
+SQL_GET_VENDOR_NOTIFY_INFO = "SELECT telegram_id, business_name FROM vendors WHERE vendor_id = ?"
+
+SQL_GET_VENDOR_BY_TID = """
+    SELECT vendor_id, telegram_id, business_name, services, keywords, contact,
+           bot_username, description, price_range, total_orders, avg_rating
+    FROM vendors WHERE telegram_id = ?
+"""
+
+SQL_INSERT_VENDOR = """
+    INSERT INTO vendors (telegram_id, business_name, services,
+                         contact, bot_username, description, price_range)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+"""
+
+SQL_GET_VENDOR_DETAILS = """
+    SELECT business_name, services, description, contact, bot_username,
+           price_range, avg_rating, total_orders
+    FROM vendors WHERE vendor_id = ?
+"""
+
+SQL_GET_VENDOR_BOT = """
+    SELECT business_name, bot_username
+    FROM vendors WHERE vendor_id = ?
+"""
+
+SQL_INSERT_ORDER = """
+    INSERT INTO orders (vendor_id, buyer_id, details, deadline, followup_due_at)
+    VALUES (?, ?, ?, ?, datetime('now', ?))
+"""
+
+SQL_GET_DUE_FOLLOWUPS = """
+    SELECT order_id, buyer_id, status
+    FROM orders
+    WHERE followup_due_at <= CURRENT_TIMESTAMP
+    LIMIT ?
+"""
+
+SQL_CLEAR_FOLLOWUP = "UPDATE orders SET followup_due_at = NULL WHERE order_id = ?"
+
+SQL_COMPLETE_ORDER = """
+    UPDATE orders
+    SET status = 'completed', completed_at = CURRENT_TIMESTAMP
+    WHERE order_id = ?
+"""
+
+SQL_GET_ORDER_VENDOR = "SELECT vendor_id FROM orders WHERE order_id = ?"
+
+# A repeated review of the same order is skipped rather than failing the
+# whole batch; any other constraint violation still raises
+SQL_INSERT_RATING = """
+    INSERT INTO ratings (order_id, vendor_id, buyer_id, stars, review_text)
+    VALUES (?, ?, ?, ?, ?)
+    ON CONFLICT(order_id) DO NOTHING
+"""
+
+SQL_FLAG_ORDER = """
+    UPDATE orders
+    SET status = 'flagged'
+    WHERE order_id = ?
+"""
+
+SQL_GET_VENDOR_ORDERS = """
+    SELECT order_id, details, deadline, status, created_at
+    FROM orders
+    WHERE vendor_id = ?
+    ORDER BY created_at DESC
+    LIMIT 15
+"""
+
+SQL_GET_VENDOR_RATINGS = """
+    SELECT v.vendor_id, v.business_name, v.avg_rating, v.total_orders,
+           r.stars, r.review_text, r.created_at
+    FROM vendors v
+    LEFT JOIN ratings r ON r.vendor_id = v.vendor_id
+    WHERE v.telegram_id = ?
+    ORDER BY r.created_at DESC
+    LIMIT 5
+"""
+
+# The busiest vendors and their five newest ratings, in SQL_GET_VENDOR_RATINGS
+# row shape, for warming the /myrating card cache
+SQL_GET_TOP_VENDOR_IDS = """
+    SELECT telegram_id, vendor_id FROM vendors
+    ORDER BY total_orders DESC
+    LIMIT ?
+"""
+
+SQL_GET_TOP_VENDOR_RATINGS = """
+    SELECT v.vendor_id, v.business_name, v.avg_rating, v.total_orders,
+           r.stars, r.review_text, r.created_at
+    FROM (SELECT * FROM vendors ORDER BY total_orders DESC LIMIT ?) v
+    LEFT JOIN (
+        SELECT vendor_id, stars, review_text, created_at,
+               ROW_NUMBER() OVER (PARTITION BY vendor_id ORDER BY created_at DESC) AS rn
+        FROM ratings
+    ) r ON r.vendor_id = v.vendor_id AND r.rn <= 5
+    ORDER BY v.vendor_id, r.created_at DESC
+"""
+
+SQL_GET_VENDOR_CONTACT = "SELECT business_name, contact FROM vendors WHERE vendor_id = ?"
+
+# WAL mode lets readers run alongside a writer, so reads borrow any idle
+# connection from the pool while writes queue up for the single writer
+class ConnectionPool:
+    """Pooled aiosqlite connections: read-only readers for queries plus one writer for transactions"""
+    
+    def __init__(self, path: str, min_size: int = 2, max_size: int = 10, timeout: float = 30.0):
+        self.path = path
+        self.min_size = min_size
+        self.max_size = max_size
+        self.timeout = timeout
+        self.writer: Optional[aiosqlite.Connection] = None
+        self._idle: asyncio.Queue = asyncio.Queue()
+        self._size = 0
+        # aiosqlite yields to the event loop between statements, so write
+        # transactions hold this lock to keep handlers from committing (or
+        # rolling back) each other's half-finished writes
+        self._write_lock = asyncio.Lock()
+    
+    async def _connect(self, readonly: bool = False) -> aiosqlite.Connection:
+        # Every query is a module-level SQL_* constant, so each connection's
+        # statement cache holds them all and steady-state calls skip parsing
+        if readonly:
+            # Readers can never take the write lock; WAL mode is persistent,
+            # so they pick it up from the file the writer already set up
+            conn = await aiosqlite.connect(
+                f"file:{self.path}?mode=ro", uri=True, isolation_level=None, cached_statements=256
+            )
+        else:
+            conn = await aiosqlite.connect(self.path, isolation_level=None, cached_statements=256)
+            await conn.execute("PRAGMA journal_mode=WAL")
+            await conn.execute("PRAGMA synchronous=NORMAL")
+        await conn.execute("PRAGMA temp_store=MEMORY")
+        await conn.execute("PRAGMA cache_size=-64000")
+        await conn.execute("PRAGMA mmap_size=268435456")
+        return conn
+    
+    async def open(self):
+        self.writer = await self._connect()
+        for _ in range(self.min_size):
+            self._idle.put_nowait(await self._connect(readonly=True))
+        self._size = self.min_size
+    
+    async def close(self):
+        while not self._idle.empty():
+            await self._idle.get_nowait().close()
+        if self.writer is not None:
+            await self.writer.close()
+    
+    @asynccontextmanager
+    async def acquire(self):
+        """Borrow a reader connection, opening a new one if all are busy and the pool can grow"""
+        try:
+            conn = self._idle.get_nowait()
+        except asyncio.QueueEmpty:
+            if self._size < self.max_size:
+                self._size += 1
+                try:
+                    conn = await self._connect(readonly=True)
+                except BaseException:
+                    self._size -= 1
+                    raise
+            else:
+                conn = await asyncio.wait_for(self._idle.get(), self.timeout)
+        try:
+            yield conn
+        finally:
+            self._idle.put_nowait(conn)
+    
+    @asynccontextmanager
+    async def transaction(self):
+        """Run one write transaction on the writer: commit on success, roll back on error"""
+        async with self._write_lock:
+            await self.writer.execute("BEGIN IMMEDIATE")
+            try:
+                yield self.writer
+            except BaseException:
+                await self.writer.rollback()
+                raise
+            else:
+                await self.writer.commit()
+
+db_pool = ConnectionPool(DB_NAME)
+
+class OutboundQueue:
+    """Bot-initiated messages, sent by a few workers sharing one rate limiter"""
+    
+    def __init__(self, rate: int = OUTBOUND_RATE, workers: int = OUTBOUND_WORKERS):
+        self.workers = workers
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._limiter = AsyncLimiter(rate, 1)
+        self._tasks: List[asyncio.Task] = []
+    
+    def start(self):
+        self._tasks = [asyncio.create_task(self._drain()) for _ in range(self.workers)]
+    
+    async def stop(self):
+        """Send everything queued so far, then stop the workers"""
+        await self._queue.join()
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+    
+    async def put(self, chat_id: int, text: str, **kwargs):
+        await self._queue.put((chat_id, text, kwargs))
+    
+    async def _drain(self):
+        while True:
+            chat_id, text, kwargs = await self._queue.get()
+            try:
+                while True:
+                    try:
+                        async with self._limiter:
+                            await bot.send_message(chat_id, text, **kwargs)
+                    except TelegramRetryAfter as e:
+                        # Hit the flood limit anyway; Telegram says when to try again
+                        logger.warning(f"Send to {chat_id} rate limited, retrying in {e.retry_after}s")
+                        await asyncio.sleep(e.retry_after)
+                    else:
+                        break
+            except Exception as e:
+                logger.error(f"Send to {chat_id} failed: {e}")
+            finally:
+                self._queue.task_done()
+
+outbound = OutboundQueue()
+
+class RatingWriter:
+    """Rating inserts, queued by handlers and committed in batches by one task"""
+    
+    def __init__(self, batch_size: int = RATING_BATCH_SIZE, interval: float = RATING_FLUSH_SECONDS):
+        self.batch_size = batch_size
+        self.interval = interval
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._task: Optional[asyncio.Task] = None
+    
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+    
+    async def stop(self):
+        """Write out everything queued so far, then stop"""
+        if self._task is not None:
+            await self._queue.put(None)
+            await self._task
+    
+    def put(self, order_id: int, vendor_id: int, buyer_id: int, stars: int, review: Optional[str]):
+        self._queue.put_nowait((order_id, vendor_id, buyer_id, stars, review))
+    
+    async def _run(self):
+        while True:
+            batch = [await self._queue.get()]
+            # Give a burst of reviews a moment to arrive and share one commit
+            await asyncio.sleep(self.interval)
+            while len(batch) < self.batch_size and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+            
+            rows = [row for row in batch if row is not None]
+            if rows:
+                await self._write(rows)
+            if len(rows) < len(batch):
+                return
+    
+    async def _write(self, rows: list):
+        try:
+            async with db_pool.transaction() as conn:
+                await conn.executemany(SQL_INSERT_RATING, rows)
+        except Exception as e:
+            if len(rows) == 1:
+                logger.error(f"Saving rating for order {rows[0][0]} failed: {e}")
+                return
+            # Don't let one bad rating cost the rest of the batch
+            for row in rows:
+                await self._write([row])
+            return
+        
+        for vendor_id in {row[1] for row in rows}:
+            invalidate_rating_card(vendor_id)
+
+rating_writer = RatingWriter()
+
+async def init_db():
+    """Open the connection pool and initialize the database with required tables"""
+    await db_pool.open()
+    conn = db_pool.writer
+    
+    # keywords used to be filled in by the bot at registration; older
+    # databases are rebuilt so SQLite derives it from services instead
+    async with conn.execute("PRAGMA table_xinfo(vendors)") as cursor:
+        vendor_columns = {name: hidden for _, name, _, _, _, _, hidden in await cursor.fetchall()}
+    migrate_keywords = vendor_columns.get('keywords') == 0
+    
+    if migrate_keywords:
+        await conn.execute("BEGIN")
+        await conn.execute(VENDORS_TABLE_SQL.format(table="vendors_new"))
+        await conn.execute("""
+            INSERT INTO vendors_new (vendor_id, telegram_id, business_name, services, contact,
+                                     bot_username, description, price_range, total_orders,
+                                     avg_rating, created_at)
+            SELECT vendor_id, telegram_id, business_name, services, contact,
+                   bot_username, description, price_range, total_orders,
+                   avg_rating, created_at
+            FROM vendors
+        """)
+        await conn.execute("DROP TABLE vendors")
+        await conn.execute("ALTER TABLE vendors_new RENAME TO vendors")
+        await conn.commit()
+    else:
+        await conn.execute(VENDORS_TABLE_SQL.format(table="vendors"))
     
-    cursor.execute("""
+    await conn.execute("""
         CREATE TABLE IF NOT EXISTS orders (
             order_id INTEGER PRIMARY KEY AUTOINCREMENT,
             vendor_id INTEGER NOT NULL,
@@ -65,11 +473,18 @@ def init_db():
             status TEXT DEFAULT 'pending',
             created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
             completed_at TIMESTAMP,
+            followup_due_at TIMESTAMP,
             FOREIGN KEY (vendor_id) REFERENCES vendors(vendor_id)
         )
     """)
     
-    cursor.execute("""
+    # Databases created before follow-ups were scheduled in the table
+    async with conn.execute("PRAGMA table_info(orders)") as cursor:
+        order_columns = {row[1] for row in await cursor.fetchall()}
+    if 'followup_due_at' not in order_columns:
+        await conn.execute("ALTER TABLE orders ADD COLUMN followup_due_at TIMESTAMP")
+    
+    await conn.execute("""
         CREATE TABLE IF NOT EXISTS ratings (
             rating_id INTEGER PRIMARY KEY AUTOINCREMENT,
             order_id INTEGER UNIQUE NOT NULL,
@@ -83,8 +498,76 @@ def init_db():
         )
     """)
     
-    conn.commit()
-    conn.close()
+    # Covers the /myrating query (newest five reviews per vendor) without
+    # touching the ratings table itself
+    await conn.execute("DROP INDEX IF EXISTS idx_ratings_vendor")
+    await conn.execute("""
+        CREATE INDEX IF NOT EXISTS idx_ratings_vendor_created
+        ON ratings(vendor_id, created_at DESC, stars, review_text)
+    """)
+    
+    # Keep each vendor's rating summary current as ratings come in, instead
+    # of re-aggregating all of its ratings after every insert
+    await conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS ratings_summary_ai AFTER INSERT ON ratings BEGIN
+            UPDATE vendors
+            SET avg_rating = (avg_rating * total_orders + new.stars) / (total_orders + 1),
+                total_orders = total_orders + 1
+            WHERE vendor_id = new.vendor_id;
+        END
+    """)
+    await conn.execute("CREATE INDEX IF NOT EXISTS idx_orders_vendor_created ON orders(vendor_id, created_at DESC)")
+    await conn.execute("""
+        CREATE INDEX IF NOT EXISTS idx_orders_followup_due ON orders(followup_due_at)
+        WHERE followup_due_at IS NOT NULL
+    """)
+    
+    async with conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'vendors_fts'") as cursor:
+        fts_exists = await cursor.fetchone() is not None
+    
+    # Full-text index over the searchable vendor fields, kept in sync with
+    # the vendors table by the triggers below (FTS5 external content table)
+    await conn.execute("""
+        CREATE VIRTUAL TABLE IF NOT EXISTS vendors_fts USING fts5(
+            business_name, services, keywords, description,
+            content='vendors', content_rowid='vendor_id',
+            tokenize='unicode61 remove_diacritics 2'
+        )
+    """)
+    
+    await conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS vendors_fts_ai AFTER INSERT ON vendors BEGIN
+            INSERT INTO vendors_fts(rowid, business_name, services, keywords, description)
+            VALUES (new.vendor_id, new.business_name, new.services, new.keywords, new.description);
+        END
+    """)
+    
+    await conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS vendors_fts_ad AFTER DELETE ON vendors BEGIN
+            INSERT INTO vendors_fts(vendors_fts, rowid, business_name, services, keywords, description)
+            VALUES ('delete', old.vendor_id, old.business_name, old.services, old.keywords, old.description);
+        END
+    """)
+    
+    # Only the indexed columns matter here; rating summary updates must not
+    # rewrite the vendor's FTS entry (recreated to narrow older databases)
+    await conn.execute("DROP TRIGGER IF EXISTS vendors_fts_au")
+    await conn.execute("""
+        CREATE TRIGGER vendors_fts_au AFTER UPDATE OF business_name, services, description ON vendors BEGIN
+            INSERT INTO vendors_fts(vendors_fts, rowid, business_name, services, keywords, description)
+            VALUES ('delete', old.vendor_id, old.business_name, old.services, old.keywords, old.description);
+            INSERT INTO vendors_fts(rowid, business_name, services, keywords, description)
+            VALUES (new.vendor_id, new.business_name, new.services, new.keywords, new.description);
+        END
+    """)
+    
+    if not fts_exists or migrate_keywords:
+        # Index vendors that were registered before the FTS table existed
+        # (or whose keywords were just regenerated)
+        await conn.execute("INSERT INTO vendors_fts(vendors_fts) VALUES ('rebuild')")
+    
+    await conn.execute("ANALYZE")
+    await conn.commit()
     logger.info("Database initialized successfully")
 
 # FSM States
@@ -106,138 +589,243 @@ class RatingState(StatesGroup):
     stars = State()
     review = State()
 
+# Search results
+class VendorHit(NamedTuple):
+    vendor_id: int
+    business_name: str
+    services: str
+    description: str
+    contact: str
+    bot_username: Optional[str]
+    price_range: str
+    avg_rating: float
+    total_orders: int
+    score: float
+
 # Helper functions
-def get_db_connection():
-    return sqlite3.connect(DB_NAME, check_same_thread=False)
+_STOPWORDS = frozenset({
+    'the', 'a', 'an', 'and', 'or', 'but', 'in', 'on', 'at', 'to', 'for',
+    'of', 'with', 'by', 'from', 'is', 'are', 'was', 'were', 'i', 'you',
+    'my', 'your', 'do', 'does', 'need', 'want', 'looking', 'find', 'get',
+    'have', 'has', 'can', 'could', 'would', 'should', 'will', 'am'
+})
+
+# Whole words of three or more characters; the length filter is part of the pattern
+_KEYWORD_RE = re.compile(r'\w{3,}')
+
+# Intent phrases in priority order: when a message matches several intents,
+# the one listed first wins
+_INTENT_PHRASES = {
+    'greeting': frozenset({'hi', 'hello', 'hey', 'good morning', 'good afternoon', 'good evening', 'sup', "what's up", 'whatsup'}),
+    'thanks': frozenset({'thank', 'thanks', 'appreciate', 'grateful'}),
+    'help': frozenset({'what can you do', 'how does this work', 'what is this', 'help me', 'what do you do'}),
+    'register': frozenset({'register', 'sign up', 'create account', 'add my business', 'list my business', 'become vendor'}),
+    'search': frozenset({'need', 'want', 'looking', 'find', 'where', 'who', 'buy', 'get', 'order', 'search'}),
+}
+_INTENTS = tuple(_INTENT_PHRASES)
+
+_NO_BOT_ANSWERS = frozenset({'no', 'skip', 'none', 'nope', 'na', 'n/a', "don't have", "dont have"})
+
+_STATUS_EMOJI = {"pending": "⏳", "completed": "✅", "flagged": "⚠️"}
+
+_STARS = tuple('⭐' * i for i in range(6))
+
+_NO_RATINGS_TMPL = "📊 <b>{}</b>\n\nNo ratings yet.\n\nComplete a few orders to build your reputation!"
+
+_GREETING_RESPONSES = (
+    "Hey! What can I help you find today?",
+    "Hi there! Looking for something specific?",
+    "Hello! Need a vendor for something?",
+    "Hey! What do you need today?",
+    "Hi! How can I help you out?"
+)
+
+_THANKS_RESPONSES = (
+    "You're welcome! Anything else you need?",
+    "Happy to help! Need anything else?",
+    "No problem! What else can I do for you?",
+    "Glad I could help! Looking for anything else?",
+    "Anytime! Just let me know if you need more help."
+)
+
+def build_intent_automaton() -> "ahocorasick.Automaton":
+    """Build one Aho-Corasick automaton holding every intent phrase, tagged with its priority"""
+    automaton = ahocorasick.Automaton()
+    for priority, intent in enumerate(_INTENTS):
+        for phrase in _INTENT_PHRASES[intent]:
+            if phrase not in automaton:
+                automaton.add_word(phrase, priority)
+    automaton.make_automaton()
+    return automaton
+
+def build_intent_patterns() -> tuple:
+    """Build one compiled alternation regex per intent, in priority order"""
+    return tuple(
+        re.compile('|'.join(map(re.escape, _INTENT_PHRASES[intent])))
+        for intent in _INTENTS
+    )
+
+if ahocorasick is not None:
+    _INTENT_AUTOMATON = build_intent_automaton()
+    _INTENT_PATTERNS = ()
+else:
+    _INTENT_AUTOMATON = None
+    _INTENT_PATTERNS = build_intent_patterns()
+
+def build_keyword_matcher(keywords: List[str]) -> Callable[[str], bool]:
+    """Return a predicate telling whether a text contains any of the keywords"""
+    # Building an automaton only pays off once there are a few keywords to find
+    if ahocorasick is None or len(keywords) <= 2:
+        return lambda text: any(keyword in text for keyword in keywords)
+    
+    automaton = ahocorasick.Automaton()
+    for keyword in keywords:
+        automaton.add_word(keyword, keyword)
+    automaton.make_automaton()
+    return lambda text: next(automaton.iter(text), None) is not None
 
 def extract_keywords(text: str) -> List[str]:
-    words = re.findall(r'\b\w+\b', text.lower())
-    stopwords = {'the', 'a', 'an', 'and', 'or', 'but', 'in', 'on', 'at', 'to', 'for', 
-                 'of', 'with', 'by', 'from', 'is', 'are', 'was', 'were', 'i', 'you',
-                 'my', 'your', 'do', 'does', 'need', 'want', 'looking', 'find', 'get',
-                 'have', 'has', 'can', 'could', 'would', 'should', 'will', 'am'}
-    keywords = [w for w in words if w not in stopwords and len(w) > 2]
-    return keywords
+    return [w for w in _KEYWORD_RE.findall(text.lower()) if w not in _STOPWORDS]
 
-def detect_intent(text: str) -> str:
-    text_lower = text.lower()
-    
-    greetings = ['hi', 'hello', 'hey', 'good morning', 'good afternoon', 'good evening', 'sup', "what's up", 'whatsup']
-    if any(greet in text_lower for greet in greetings):
-        return 'greeting'
-    
-    thanks = ['thank', 'thanks', 'appreciate', 'grateful']
-    if any(thank in text_lower for thank in thanks):
-        return 'thanks'
+def match_intent_priority(text_lower: str) -> Optional[int]:
+    """Return the priority of the highest-ranked intent phrase found in the text, if any"""
+    best = None
+    
+    if _INTENT_AUTOMATON is not None:
+        for _, priority in _INTENT_AUTOMATON.iter(text_lower):
+            if best is None or priority < best:
+                best = priority
+                if best == 0:
+                    break
+    else:
+        for priority, pattern in enumerate(_INTENT_PATTERNS):
+            if pattern.search(text_lower):
+                best = priority
+                break
     
-    bot_questions = ['what can you do', 'how does this work', 'what is this', 'help me', 'what do you do']
-    if any(q in text_lower for q in bot_questions):
-        return 'help'
+    return best
+
+# Messages that are exactly one intent phrase ("hi", "thanks") are the
+# common case; their result is precomputed so they skip the scan
+_PHRASE_INTENT_PRIORITY = {
+    phrase: match_intent_priority(phrase)
+    for phrases in _INTENT_PHRASES.values()
+    for phrase in phrases
+}
+
+def detect_intent(text: str) -> str:
+    text_lower = text if text.islower() else text.lower()
     
-    register_keywords = ['register', 'sign up', 'create account', 'add my business', 'list my business', 'become vendor']
-    if any(keyword in text_lower for keyword in register_keywords):
-        return 'register'
+    best = _PHRASE_INTENT_PRIORITY.get(text_lower.strip())
+    if best is None:
+        best = match_intent_priority(text_lower)
     
-    search_indicators = ['need', 'want', 'looking', 'find', 'where', 'who', 'buy', 'get', 'order', 'search']
-    if any(indicator in text_lower for indicator in search_indicators):
-        return 'search'
+    if best is not None:
+        return _INTENTS[best]
     
     if len(extract_keywords(text)) > 0:
         return 'search'
     
     return 'unknown'
 
-def search_vendors(query: str) -> List[dict]:
+def build_fts_query(keywords: List[str]) -> str:
+    """Turn extracted keywords into an FTS5 MATCH expression (prefix OR query)"""
+    terms = []
+    for keyword in keywords:
+        keyword = keyword.replace('"', '')
+        if keyword:
+            terms.append(f'"{keyword}"*')
+    return " OR ".join(terms)
+
+async def search_vendors(query: str) -> List[VendorHit]:
     query_keywords = extract_keywords(query)
+    fts_query = build_fts_query(query_keywords)
     
-    if not query_keywords:
+    if not fts_query:
         return []
     
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    cursor.execute("""
-        SELECT vendor_id, business_name, services, keywords, description, 
-               contact, bot_username, price_range, avg_rating, total_orders
-        FROM vendors
-    """)
-    vendors = cursor.fetchall()
-    conn.close()
+    async with db_pool.acquire() as conn, conn.execute(SQL_SEARCH_VENDORS, (fts_query,)) as cursor:
+        vendors = await cursor.fetchall()
     
+    has_keyword = build_keyword_matcher(query_keywords)
     results = []
     for vendor in vendors:
-        vid, name, services, keywords, desc, contact, bot_user, price, rating, orders = vendor
-        searchable = f"{name} {services} {keywords} {desc}".lower()
-        score = sum(1 for keyword in query_keywords if keyword in searchable)
+        vid, name, services, keywords, desc, contact, bot_user, price, rating, orders, rank = vendor
+        # bm25() is lower-is-better, flip it so higher scores rank first
+        score = -rank
         
-        if any(keyword in services.lower() for keyword in query_keywords):
+        # keywords is the lowercased services text, generated by SQLite
+        if has_keyword(keywords):
             score += 2
         
-        if score > 0:
-            results.append({
-                'vendor_id': vid,
-                'business_name': name,
-                'services': services,
-                'description': desc,
-                'contact': contact,
-                'bot_username': bot_user,
-                'price_range': price,
-                'avg_rating': rating,
-                'total_orders': orders,
-                'score': score
-            })
-    
-    results.sort(key=lambda x: x['score'], reverse=True)
-    return results
-
-def get_vendor_by_telegram_id(telegram_id: int) -> Optional[dict]:
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM vendors WHERE telegram_id = ?", (telegram_id,))
-    result = cursor.fetchone()
-    conn.close()
+        results.append(VendorHit(vid, name, services, desc, contact, bot_user, price, rating, orders, score))
     
-    if result:
-        return {
-            "vendor_id": result[0],
-            "telegram_id": result[1],
-            "business_name": result[2],
-            "services": result[3],
-            "keywords": result[4],
-            "contact": result[5],
-            "bot_username": result[6],
-            "description": result[7],
-            "price_range": result[8],
-            "total_orders": result[9],
-            "avg_rating": result[10]
-        }
-    return None
-
-def update_vendor_rating(vendor_id: int):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    cursor.execute("""
-        SELECT AVG(stars), COUNT(*) 
-        FROM ratings 
-        WHERE vendor_id = ?
-    """, (vendor_id,))
-    
-    result = cursor.fetchone()
-    avg_rating = result[0] if result[0] else 0.0
-    total_orders = result[1]
-    
-    cursor.execute("""
-        UPDATE vendors 
-        SET avg_rating = ?, total_orders = ?
-        WHERE vendor_id = ?
-    """, (avg_rating, total_orders, vendor_id))
-    
-    conn.commit()
-    conn.close()
+    # Only the top 10 are ever shown (see vendor_list_keyboard)
+    return heapq.nlargest(10, results, key=operator.attrgetter('score'))
+
+async def get_vendor_notify_info(vendor_id: int) -> Optional[tuple]:
+    """Return (telegram_id, business_name) for a vendor, served from an LRU cache"""
+    vendor = _vendor_notify_cache.get(vendor_id)
+    if vendor is not None:
+        _vendor_notify_cache.move_to_end(vendor_id)
+        return vendor
+    
+    async with db_pool.acquire() as conn, conn.execute(SQL_GET_VENDOR_NOTIFY_INFO, (vendor_id,)) as cursor:
+        vendor = await cursor.fetchone()
+    
+    if vendor is not None:
+        _vendor_notify_cache[vendor_id] = vendor
+        if len(_vendor_notify_cache) > VENDOR_CACHE_SIZE:
+            _vendor_notify_cache.popitem(last=False)
+    return vendor
+
+async def get_vendor_contact(vendor_id: int) -> Optional[tuple]:
+    """Return (business_name, contact) for a vendor, served from a short-lived LRU cache"""
+    cached = _contact_cache.get(vendor_id)
+    if cached is not None and time.monotonic() - cached[0] < CONTACT_CACHE_TTL:
+        _contact_cache.move_to_end(vendor_id)
+        return cached[1]
+    
+    async with db_pool.acquire() as conn, conn.execute(SQL_GET_VENDOR_CONTACT, (vendor_id,)) as cursor:
+        vendor = await cursor.fetchone()
+    
+    if vendor is not None:
+        _contact_cache[vendor_id] = (time.monotonic(), vendor)
+        _contact_cache.move_to_end(vendor_id)
+        if len(_contact_cache) > VENDOR_CACHE_SIZE:
+            _contact_cache.popitem(last=False)
+    return vendor
+
+async def get_vendor_by_telegram_id(telegram_id: int) -> Optional[dict]:
+    async with db_pool.acquire() as conn, conn.execute(SQL_GET_VENDOR_BY_TID, (telegram_id,)) as cursor:
+        result = await cursor.fetchone()
+        columns = [column[0] for column in cursor.description]
+    
+    return dict(zip(columns, result)) if result else None
+
+def invalidate_rating_card(vendor_id: int):
+    """Drop a vendor's cached /myrating card after its rating summary changed"""
+    global _rating_generation
+    _rating_generation += 1
+    _rating_card_cache.pop(vendor_id, None)
 
 # Keyboards
-def vendor_action_keyboard(vendor_id: int, has_bot: bool = False):
+# Static keyboards and rows are built once and shared between messages
+_RATING_KEYBOARD = InlineKeyboardMarkup(inline_keyboard=[
+    [InlineKeyboardButton(text=f"{'⭐' * i} ({i})", callback_data=f"rate_{i}")]
+    for i in range(1, 6)
+])
+_SEARCH_AGAIN_ROW = [InlineKeyboardButton(text="🔍 Search Again", callback_data="search_again")]
+_NEW_SEARCH_ROW = [InlineKeyboardButton(text="🔍 New Search", callback_data="search_again")]
+
+def contact_callback_data(vendor_id: int, name: str, contact: str) -> str:
+    """Carry the vendor's contact in the button itself, if it fits Telegram's 64-byte limit"""
+    data = f"c|{vendor_id}|{name}|{contact}"
+    if '|' in name or len(data.encode()) > 64:
+        return f"contact_{vendor_id}"
+    return data
+
+def vendor_action_keyboard(vendor_id: int, name: str, contact: str, has_bot: bool = False):
     buttons = []
     
     if has_bot:
@@ -245,52 +833,29 @@ def vendor_action_keyboard(vendor_id: int, has_bot: bool = False):
     else:
         buttons.append([InlineKeyboardButton(text="📦 Place Order", callback_data=f"order_{vendor_id}")])
     
-    buttons.append([InlineKeyboardButton(text="📞 View Contact", callback_data=f"contact_{vendor_id}")])
-    buttons.append([InlineKeyboardButton(text="🔍 Search Again", callback_data="search_again")])
+    buttons.append([InlineKeyboardButton(text="📞 View Contact", callback_data=contact_callback_data(vendor_id, name, contact))])
+    buttons.append(_SEARCH_AGAIN_ROW)
     
     return InlineKeyboardMarkup(inline_keyboard=buttons)
 
-def rating_keyboard():
-    buttons = [
-        [InlineKeyboardButton(text=f"{'⭐' * i} ({i})", callback_data=f"rate_{i}")]
-        for i in range(1, 6)
-    ]
-    return InlineKeyboardMarkup(inline_keyboard=buttons)
-
-def vendor_list_keyboard(vendors: List[dict]):
+def vendor_list_keyboard(vendors: List[VendorHit]):
     buttons = []
     for vendor in vendors[:10]:
-        rating_display = f"⭐ {vendor['avg_rating']:.1f} ({vendor['total_orders']})" if vendor['total_orders'] > 0 else "New"
-        text = f"{vendor['business_name']} - {rating_display}"
+        rating_display = f"⭐ {vendor.avg_rating:.1f} ({vendor.total_orders})" if vendor.total_orders > 0 else "New"
+        text = f"{vendor.business_name} - {rating_display}"
         buttons.append([InlineKeyboardButton(
             text=text,
-            callback_data=f"vendor_{vendor['vendor_id']}"
+            callback_data=f"vendor_{vendor.vendor_id}"
         )])
     
-    buttons.append([InlineKeyboardButton(text="🔍 New Search", callback_data="search_again")])
+    buttons.append(_NEW_SEARCH_ROW)
     return InlineKeyboardMarkup(inline_keyboard=buttons)
 
 def get_greeting_response():
-    import random
-    greetings = [
-        "Hey! What can I help you find today?",
-        "Hi there! Looking for something specific?",
-        "Hello! Need a vendor for something?",
-        "Hey! What do you need today?",
-        "Hi! How can I help you out?"
-    ]
-    return random.choice(greetings)
+    return random.choice(_GREETING_RESPONSES)
 
 def get_thanks_response():
-    import random
-    responses = [
-        "You're welcome! Anything else you need?",
-        "Happy to help! Need anything else?",
-        "No problem! What else can I do for you?",
-        "Glad I could help! Looking for anything else?",
-        "Anytime! Just let me know if you need more help."
-    ]
-    return random.choice(responses)
+    return random.choice(_THANKS_RESPONSES)
 
 # Command handlers
 @dp.message(Command("start"))
@@ -311,7 +876,7 @@ async def cmd_start(message: types.Message):
 
 @dp.message(Command("register"))
 async def cmd_register(message: types.Message, state: FSMContext):
-    existing_vendor = get_vendor_by_telegram_id(message.from_user.id)
+    existing_vendor = await get_vendor_by_telegram_id(message.from_user.id)
     
     if existing_vendor:
         await message.answer(
@@ -342,9 +907,7 @@ async def process_business_name(message: types.Message, state: FSMContext):
 @dp.message(VendorRegistration.services)
 async def process_services(message: types.Message, state: FSMContext):
     services = message.text
-    keywords = ' '.join(extract_keywords(services))
-    
-    await state.update_data(services=services, keywords=keywords)
+    await state.update_data(services=services)
     await message.answer(
         "Got it! How should customers reach you?\n\n"
         "Drop your WhatsApp number or Telegram username."
@@ -366,7 +929,7 @@ async def process_contact(message: types.Message, state: FSMContext):
 async def process_bot_username(message: types.Message, state: FSMContext):
     text = message.text.lower()
     
-    if text in ['no', 'skip', 'none', 'nope', 'na', 'n/a', "don't have", "dont have"]:
+    if text in _NO_BOT_ANSWERS:
         bot_username = None
         next_message = "No problem! Now give me a short pitch about your business."
     else:
@@ -399,25 +962,17 @@ async def process_description(message: types.Message, state: FSMContext):
 async def process_price_range(message: types.Message, state: FSMContext):
     data = await state.get_data()
     
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
     try:
-        cursor.execute("""
-            INSERT INTO vendors (telegram_id, business_name, services, keywords, 
-                               contact, bot_username, description, price_range)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-        """, (
-            message.from_user.id,
-            data['business_name'],
-            data['services'],
-            data['keywords'],
-            data['contact'],
-            data.get('bot_username'),
-            data['description'],
-            message.text
-        ))
-        conn.commit()
+        async with db_pool.transaction() as conn:
+            await conn.execute(SQL_INSERT_VENDOR, (
+                message.from_user.id,
+                data['business_name'],
+                data['services'],
+                data['contact'],
+                data.get('bot_username'),
+                data['description'],
+                message.text
+            ))
         
         bot_info = f"\n\nOrders will be sent to your bot: {data['bot_username']}" if data.get('bot_username') else ""
         
@@ -433,7 +988,6 @@ async def process_price_range(message: types.Message, state: FSMContext):
         logger.error(f"Registration error: {e}")
         await message.answer("Hmm, something went wrong. Try /register again?")
     finally:
-        conn.close()
         await state.clear()
 
 @dp.message(F.text & ~F.text.startswith('/'))
@@ -468,7 +1022,7 @@ async def handle_conversation(message: types.Message, state: FSMContext):
         await cmd_register(message, state)
     
     elif intent == 'search':
-        results = search_vendors(text)
+        results = await search_vendors(text)
         
         if not results:
             await message.answer(
@@ -494,22 +1048,22 @@ async def handle_conversation(message: types.Message, state: FSMContext):
             "Like \"I need food\" or \"looking for laundry service\""
         )
 
-async def show_vendor_info(message: types.Message, vendor: dict):
-    rating_text = f"⭐ {vendor['avg_rating']:.1f} ({vendor['total_orders']} orders)" if vendor['total_orders'] > 0 else "New Vendor"
-    bot_badge = " 🤖" if vendor.get('bot_username') else ""
+async def show_vendor_info(message: types.Message, vendor: VendorHit):
+    rating_text = f"⭐ {vendor.avg_rating:.1f} ({vendor.total_orders} orders)" if vendor.total_orders > 0 else "New Vendor"
+    bot_badge = " 🤖" if vendor.bot_username else ""
     
     details = (
-        f"🏪 **{vendor['business_name']}**{bot_badge}\n\n"
-        f"📋 {vendor['services']}\n"
-        f"💰 {vendor['price_range']}\n"
+        f"🏪 **{vendor.business_name}**{bot_badge}\n\n"
+        f"📋 {vendor.services}\n"
+        f"💰 {vendor.price_range}\n"
         f"📊 {rating_text}\n\n"
-        f"{vendor['description']}\n\n"
+        f"{vendor.description}\n\n"
         f"Ready to order?"
     )
     
     await message.answer(
         details, 
-        reply_markup=vendor_action_keyboard(vendor['vendor_id'], bool(vendor.get('bot_username'))),
+        reply_markup=vendor_action_keyboard(vendor.vendor_id, vendor.business_name, vendor.contact, bool(vendor.bot_username)),
         parse_mode="Markdown"
     )
 
@@ -517,33 +1071,26 @@ async def show_vendor_info(message: types.Message, vendor: dict):
 async def show_vendor_details(callback: types.CallbackQuery):
     vendor_id = int(callback.data.replace("vendor_", ""))
     
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("""
-        SELECT business_name, services, description, contact, bot_username,
-               price_range, avg_rating, total_orders
-        FROM vendors WHERE vendor_id = ?
-    """, (vendor_id,))
-    result = cursor.fetchone()
-    conn.close()
+    async with db_pool.acquire() as conn, conn.execute(SQL_GET_VENDOR_DETAILS, (vendor_id,)) as cursor:
+        result = await cursor.fetchone()
     
     if result:
-        name, services, desc, contact, bot_user, price, rating, orders = result
-        rating_text = f"⭐ {rating:.1f} ({orders} orders)" if orders > 0 else "New Vendor"
-        bot_badge = " 🤖" if bot_user else ""
+        name, services, description, contact, bot_username, price_range, avg_rating, total_orders = result
+        rating_text = f"⭐ {avg_rating:.1f} ({total_orders} orders)" if total_orders > 0 else "New Vendor"
+        bot_badge = " 🤖" if bot_username else ""
         
         details = (
             f"🏪 **{name}**{bot_badge}\n\n"
             f"📋 {services}\n"
-            f"💰 {price}\n"
+            f"💰 {price_range}\n"
             f"📊 {rating_text}\n\n"
-            f"{desc}\n\n"
+            f"{description}\n\n"
             f"Ready to order?"
         )
         
         await callback.message.edit_text(
             details, 
-            reply_markup=vendor_action_keyboard(vendor_id, bool(bot_user)),
+            reply_markup=vendor_action_keyboard(vendor_id, name, contact, bool(bot_username)),
             parse_mode="Markdown"
         )
     
@@ -561,14 +1108,8 @@ async def search_again(callback: types.CallbackQuery):
 async def redirect_to_vendor_bot(callback: types.CallbackQuery):
     vendor_id = int(callback.data.replace("botorder_", ""))
     
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("""
-        SELECT business_name, bot_username 
-        FROM vendors WHERE vendor_id = ?
-    """, (vendor_id,))
-    result = cursor.fetchone()
-    conn.close()
+    async with db_pool.acquire() as conn, conn.execute(SQL_GET_VENDOR_BOT, (vendor_id,)) as cursor:
+        result = await cursor.fetchone()
     
     if result and result[1]:
         name, bot_username = result
@@ -622,20 +1163,11 @@ async def complete_order(message: types.Message, state: FSMContext):
     data = await state.get_data()
     vendor_id = data['vendor_id']
     
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    cursor.execute("""
-        INSERT INTO orders (vendor_id, buyer_id, details, deadline)
-        VALUES (?, ?, ?, ?)
-    """, (vendor_id, message.from_user.id, data['order_details'], message.text))
+    vendor = await get_vendor_notify_info(vendor_id)
     
-    order_id = cursor.lastrowid
-    
-    cursor.execute("SELECT telegram_id, business_name FROM vendors WHERE vendor_id = ?", (vendor_id,))
-    vendor = cursor.fetchone()
-    conn.commit()
-    conn.close()
+    async with db_pool.transaction() as conn:
+        async with conn.execute(SQL_INSERT_ORDER, (vendor_id, message.from_user.id, data['order_details'], message.text, FOLLOWUP_DELAY)) as cursor:
+            order_id = cursor.lastrowid
     
     if vendor:
         vendor_telegram_id, business_name = vendor
@@ -652,80 +1184,94 @@ async def complete_order(message: types.Message, state: FSMContext):
             f"Contact them: {buyer_username}"
         )
         
-        try:
-            await bot.send_message(vendor_telegram_id, vendor_msg, parse_mode="Markdown")
-        except Exception as e:
-            logger.error(f"Failed to notify vendor: {e}")
-        
-        await message.answer(
+        buyer_msg = (
             f"✅ Order placed!\n\n"
             f"**Order #{order_id}**\n"
             f"Vendor: {business_name}\n\n"
             f"Your Order:\n{data['order_details']}\n\n"
             f"Deadline: {message.text}\n\n"
             f"They've been notified and will reach out soon.\n\n"
-            f"I'll check in with you tomorrow to see how it went!",
-            parse_mode="Markdown"
+            f"I'll check in with you tomorrow to see how it went!"
         )
         
-        asyncio.create_task(schedule_order_followup(order_id, message.from_user.id))
+        # Notify the vendor and confirm to the buyer concurrently
+        vendor_result, buyer_result = await asyncio.gather(
+            bot.send_message(vendor_telegram_id, vendor_msg, parse_mode="Markdown"),
+            message.answer(buyer_msg, parse_mode="Markdown"),
+            return_exceptions=True
+        )
+        if isinstance(vendor_result, Exception):
+            logger.error(f"Failed to notify vendor: {vendor_result}")
+        if isinstance(buyer_result, Exception):
+            logger.error(f"Failed to confirm order: {buyer_result}")
     
     await state.clear()
 
-async def schedule_order_followup(order_id: int, buyer_id: int):
-    await asyncio.sleep(86400)
-    
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT status FROM orders WHERE order_id = ?", (order_id,))
-    result = cursor.fetchone()
-    conn.close()
-    
-    if result and result[0] == 'pending':
-        keyboard = InlineKeyboardMarkup(inline_keyboard=[
-            [InlineKeyboardButton(text="✅ Yes", callback_data=f"complete_{order_id}")],
-            [InlineKeyboardButton(text="❌ No", callback_data=f"incomplete_{order_id}")]
-        ])
+async def send_order_followup(order_id: int, buyer_id: int):
+    keyboard = InlineKeyboardMarkup(inline_keyboard=[
+        [InlineKeyboardButton(text="✅ Yes", callback_data=f"complete_{order_id}")],
+        [InlineKeyboardButton(text="❌ No", callback_data=f"incomplete_{order_id}")]
+    ])
+    
+    await outbound.put(
+        buyer_id,
+        f"Hey! Quick check about Order #{order_id}.\n\n"
+        f"Did you get everything okay?",
+        reply_markup=keyboard
+    )
+
+async def send_due_followups():
+    """Claim orders whose follow-up is due and message buyers still waiting on them"""
+    async with db_pool.transaction() as conn:
+        async with conn.execute(SQL_GET_DUE_FOLLOWUPS, (FOLLOWUP_BATCH_SIZE,)) as cursor:
+            due = await cursor.fetchall()
         
+        await conn.executemany(
+            SQL_CLEAR_FOLLOWUP,
+            [(order_id,) for order_id, _, _ in due]
+        )
+    
+    for order_id, buyer_id, status in due:
+        if status == 'pending':
+            await send_order_followup(order_id, buyer_id)
+
+async def followup_worker():
+    """Background task that sends order follow-ups as they come due"""
+    while True:
         try:
-            await bot.send_message(
-                buyer_id,
-                f"Hey! Quick check about Order #{order_id}.\n\n"
-                f"Did you get everything okay?",
-                reply_markup=keyboard
-            )
+            await send_due_followups()
         except Exception as e:
-            logger.error(f"Follow-up failed: {e}")
+            logger.error(f"Follow-up pass failed: {e}")
+        await asyncio.sleep(FOLLOWUP_POLL_SECONDS)
 
 @dp.callback_query(F.data.startswith("complete_"))
 async def order_completed(callback: types.CallbackQuery, state: FSMContext):
     order_id = int(callback.data.replace("complete_", ""))
     
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("""
-        UPDATE orders 
-        SET status = 'completed', completed_at = CURRENT_TIMESTAMP 
-        WHERE order_id = ?
-    """, (order_id,))
-    conn.commit()
-    conn.close()
+    async with db_pool.transaction() as conn:
+        await conn.execute(SQL_COMPLETE_ORDER, (order_id,))
     
     await state.update_data(order_id=order_id)
     await callback.message.edit_text(
         "Nice! How was your experience with them?",
-        reply_markup=rating_keyboard()
+        reply_markup=_RATING_KEYBOARD
     )
     await state.set_state(RatingState.stars)
     await callback.answer()
 
 @dp.callback_query(RatingState.stars, F.data.startswith("rate_"))
 async def process_rating_stars(callback: types.CallbackQuery, state: FSMContext):
-    stars = int(callback.data.replace("rate_", ""))
+    # callback_data comes back from the client, so don't trust it to be 1-5
+    stars = callback.data.replace("rate_", "")
+    if stars not in ("1", "2", "3", "4", "5"):
+        await callback.answer("Invalid rating", show_alert=True)
+        return
+    
+    stars = int(stars)
     await state.update_data(stars=stars)
     
     await callback.message.edit_text(
-        f"{'⭐' * stars}\n\n"
+        f"{_STARS[stars]}\n\n"
         f"Wanna leave a quick review? (optional)\n\n"
         f"Type it out or send /skip"
     )
@@ -739,21 +1285,10 @@ async def process_review(message: types.Message, state: FSMContext):
     stars = data['stars']
     review = None if message.text == "/skip" else message.text
     
-    conn = get_db_connection()
-    cursor = conn.cursor()
+    async with db_pool.acquire() as conn, conn.execute(SQL_GET_ORDER_VENDOR, (order_id,)) as cursor:
+        vendor_id = (await cursor.fetchone())[0]
     
-    cursor.execute("SELECT vendor_id FROM orders WHERE order_id = ?", (order_id,))
-    vendor_id = cursor.fetchone()[0]
-    
-    cursor.execute("""
-        INSERT INTO ratings (order_id, vendor_id, buyer_id, stars, review_text)
-        VALUES (?, ?, ?, ?, ?)
-    """, (order_id, vendor_id, message.from_user.id, stars, review))
-    
-    conn.commit()
-    conn.close()
-    
-    update_vendor_rating(vendor_id)
+    rating_writer.put(order_id, vendor_id, message.from_user.id, stars, review)
     
     await message.answer(
         "Thanks! Your feedback helps other students find good vendors.\n\n"
@@ -765,15 +1300,8 @@ async def process_review(message: types.Message, state: FSMContext):
 async def order_incomplete(callback: types.CallbackQuery):
     order_id = int(callback.data.replace("incomplete_", ""))
     
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("""
-        UPDATE orders 
-        SET status = 'flagged' 
-        WHERE order_id = ?
-    """, (order_id,))
-    conn.commit()
-    conn.close()
+    async with db_pool.transaction() as conn:
+        await conn.execute(SQL_FLAG_ORDER, (order_id,))
     
     await callback.message.edit_text(
         "That's not great. I've made a note of it.\n\n"
@@ -784,7 +1312,7 @@ async def order_incomplete(callback: types.CallbackQuery):
 
 @dp.message(Command("orderhistory"))
 async def cmd_order_history(message: types.Message):
-    vendor = get_vendor_by_telegram_id(message.from_user.id)
+    vendor = await get_vendor_by_telegram_id(message.from_user.id)
     
     if not vendor:
         await message.answer(
@@ -793,86 +1321,100 @@ async def cmd_order_history(message: types.Message):
         )
         return
     
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("""
-        SELECT order_id, details, deadline, status, created_at
-        FROM orders
-        WHERE vendor_id = ?
-        ORDER BY created_at DESC
-        LIMIT 15
-    """, (vendor['vendor_id'],))
-    orders = cursor.fetchall()
-    conn.close()
+    async with db_pool.acquire() as conn, conn.execute(SQL_GET_VENDOR_ORDERS, (vendor['vendor_id'],)) as cursor:
+        orders = await cursor.fetchall()
     
     if not orders:
         await message.answer("No orders yet. Keep the hustle going!")
         return
     
     history_text = f"📦 Your Recent Orders:\n\n"
-    for order in orders:
-        oid, details, deadline, status, created = order
-        status_emoji = {"pending": "⏳", "completed": "✅", "flagged": "⚠️"}.get(status, "❓")
+    for order_id, details, deadline, status, _ in orders:
+        status_emoji = _STATUS_EMOJI.get(status, "❓")
         short_details = details[:40] + "..." if len(details) > 40 else details
-        history_text += f"{status_emoji} Order #{oid}\n{short_details}\nNeeded: {deadline}\n\n"
+        history_text += f"{status_emoji} Order #{order_id}\n{short_details}\nNeeded: {deadline}\n\n"
     
     await message.answer(history_text)
 
-@dp.message(Command("myrating"))
-async def cmd_my_rating(message: types.Message):
-    vendor = get_vendor_by_telegram_id(message.from_user.id)
-    
-    if not vendor:
-        await message.answer(
-            "You're not registered as a vendor yet.\n\n"
-            "Use /register to get set up!"
-        )
-        return
+def render_rating_card(rows: list) -> str:
+    """Render the /myrating card (HTML) from SQL_GET_VENDOR_RATINGS rows"""
+    _, business_name, avg_rating, total_orders, first_stars = rows[0][:5]
+    business_name = html.escape(business_name)
+    
+    # LEFT JOIN yields a single all-NULL rating row for vendors with no ratings
+    if first_stars is None:
+        return _NO_RATINGS_TMPL.format(business_name)
+    
+    parts = [
+        f"📊 <b>{business_name}</b>\n\n"
+        f"⭐ {avg_rating:.1f} average\n"
+        f"📦 {total_orders} completed orders\n\n"
+        f"Recent Reviews:\n\n"
+    ]
     
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("""
-        SELECT stars, review_text, created_at
-        FROM ratings
-        WHERE vendor_id = ?
-        ORDER BY created_at DESC
-    """, (vendor['vendor_id'],))
-    ratings = cursor.fetchall()
-    conn.close()
+    for *_, stars, review, created in rows:
+        parts.append(_STARS[stars])
+        parts.append("\n")
+        if review:
+            parts.append(f'"{html.escape(review)}"\n')
+        parts.append(created[:10])
+        parts.append("\n\n")
     
-    if not ratings:
-        await message.answer(
-            f"📊 **{vendor['business_name']}**\n\n"
-            f"No ratings yet.\n\n"
-            f"Complete a few orders to build your reputation!",
-            parse_mode="Markdown"
-        )
+    return "".join(parts)
+
+async def warm_rating_cards():
+    """Render and cache the /myrating cards of the busiest vendors in one pass"""
+    generation = _rating_generation
+    async with db_pool.acquire() as conn:
+        async with conn.execute(SQL_GET_TOP_VENDOR_IDS, (VENDOR_CACHE_SIZE,)) as cursor:
+            vendor_ids = await cursor.fetchall()
+        async with conn.execute(SQL_GET_TOP_VENDOR_RATINGS, (VENDOR_CACHE_SIZE,)) as cursor:
+            rows = await cursor.fetchall()
+    
+    if generation != _rating_generation:
         return
     
-    rating_text = (
-        f"📊 **{vendor['business_name']}**\n\n"
-        f"⭐ {vendor['avg_rating']:.1f} average\n"
-        f"📦 {vendor['total_orders']} completed orders\n\n"
-        f"Recent Reviews:\n\n"
-    )
+    _vendor_id_by_telegram.update(vendor_ids)
+    for vendor_id, vendor_rows in groupby(rows, key=operator.itemgetter(0)):
+        # Cards cached by /myrating in the meantime are at least as fresh
+        _rating_card_cache.setdefault(vendor_id, render_rating_card(list(vendor_rows)))
+    while len(_rating_card_cache) > VENDOR_CACHE_SIZE:
+        _rating_card_cache.popitem(last=False)
+    logger.info(f"Warmed {len(vendor_ids)} rating cards")
+
+@dp.message(Command("myrating"))
+async def cmd_my_rating(message: types.Message):
+    vendor_id = _vendor_id_by_telegram.get(message.from_user.id)
+    rating_text = _rating_card_cache.get(vendor_id)
     
-    for stars, review, created in ratings[:5]:
-        rating_text += f"{'⭐' * stars}\n"
-        if review:
-            rating_text += f'"{review}"\n'
-        rating_text += f"{created[:10]}\n\n"
+    if rating_text is None:
+        generation = _rating_generation
+        async with db_pool.acquire() as conn, conn.execute(SQL_GET_VENDOR_RATINGS, (message.from_user.id,)) as cursor:
+            rows = await cursor.fetchall()
+        
+        if not rows:
+            await message.answer(
+                "You're not registered as a vendor yet.\n\n"
+                "Use /register to get set up!"
+            )
+            return
+        
+        vendor_id = rows[0][0]
+        _vendor_id_by_telegram[message.from_user.id] = vendor_id
+        rating_text = render_rating_card(rows)
+        if generation == _rating_generation:
+            _rating_card_cache[vendor_id] = rating_text
+            if len(_rating_card_cache) > VENDOR_CACHE_SIZE:
+                _rating_card_cache.popitem(last=False)
+    else:
+        _rating_card_cache.move_to_end(vendor_id)
     
-    await message.answer(rating_text, parse_mode="Markdown")
+    await outbound.put(message.chat.id, rating_text, parse_mode="HTML")
 
 @dp.callback_query(F.data.startswith("contact_"))
 async def show_contact(callback: types.CallbackQuery):
     vendor_id = int(callback.data.replace("contact_", ""))
-    
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT business_name, contact FROM vendors WHERE vendor_id = ?", (vendor_id,))
-    vendor = cursor.fetchone()
-    conn.close()
+    vendor = await get_vendor_contact(vendor_id)
     
     if vendor:
         name, contact = vendor
@@ -880,31 +1422,73 @@ async def show_contact(callback: types.CallbackQuery):
     else:
         await callback.answer("Vendor not found", show_alert=True)
 
+@dp.callback_query(F.data.startswith("c|"))
+async def show_inline_contact(callback: types.CallbackQuery):
+    parts = callback.data.split("|", 3)
+    if len(parts) < 4:
+        await callback.answer("Vendor not found", show_alert=True)
+        return
+    
+    _, _, name, contact = parts
+    await callback.answer(f"📞 {name}\n{contact}", show_alert=True)
+
 # Webhook handlers
 async def on_startup(app):
-    """Set webhook on startup"""
-    await bot.set_webhook(WEBHOOK_URL, drop_pending_updates=True)
+    """Open the database, start the background workers and set webhook on startup"""
+    global _followup_task, _warmup_task
+    await init_db()
+    outbound.start()
+    rating_writer.start()
+    _update_workers[:] = [asyncio.create_task(update_worker()) for _ in range(UPDATE_WORKERS)]
+    _followup_task = asyncio.create_task(followup_worker())
+    _warmup_task = asyncio.create_task(warm_rating_cards())
+    await bot.set_webhook(WEBHOOK_URL, drop_pending_updates=True, max_connections=WEBHOOK_MAX_CONNECTIONS)
     logger.info(f"Webhook set to {WEBHOOK_URL}")
 
 async def on_shutdown(app):
-    """Delete webhook on shutdown"""
+    """Delete webhook, stop the workers, finish in-flight updates and close the database on shutdown"""
     await bot.delete_webhook()
     logger.info("Webhook deleted")
+    for task in (_followup_task, _warmup_task):
+        if task is not None:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+    await _update_queue.join()
+    for task in _update_workers:
+        task.cancel()
+    await asyncio.gather(*_update_workers, return_exceptions=True)
+    await rating_writer.stop()
+    await outbound.stop()
+    await db_pool.close()
+
+async def update_worker():
+    """Dispatch queued updates one at a time, logging handler failures"""
+    while True:
+        update = await _update_queue.get()
+        try:
+            await dp.feed_update(bot, update)
+        except Exception as e:
+            logger.error(f"Update {update.update_id} failed: {e}")
+        finally:
+            _update_queue.task_done()
 
 async def handle_webhook(request):
-    """Handle incoming webhook requests"""
-    update = types.Update(**await request.json())
-    await dp.feed_update(bot, update)
+    """Handle incoming webhook requests, acknowledging before the update is processed"""
+    update = types.Update(**_json_loads(await request.read()))
+    try:
+        _update_queue.put_nowait(update)
+    except asyncio.QueueFull:
+        return web.Response(status=503)
     return web.Response()
 
+_HEALTH_BODY = b"Bot is running!"
+
 async def health_check(request):
     """Health check endpoint"""
-    return web.Response(text="Bot is running!")
+    return web.Response(body=_HEALTH_BODY, content_type="text/plain", charset="utf-8")
 
 def main():
     """Main entry point for webhook mode"""
-    init_db()
-    
     app = web.Application()
     app.router.add_post(WEBHOOK_PATH, handle_webhook)
     app.router.add_get("/", health_check)
@@ -912,6 +1496,9 @@ def main():
     app.on_startup.append(on_startup)
     app.on_shutdown.append(on_shutdown)
     
+    if uvloop is not None:
+        uvloop.install()
+    
     logger.info(f"Starting webhook server on port {PORT}")
     web.run_app(app, host="0.0.0.0", port=PORT)
 